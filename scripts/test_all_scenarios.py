@@ -3,10 +3,9 @@
 Comprehensive test runner for all policy scenarios
 """
 
-import json
 import sys
 from pathlib import Path
-from validate_policy import RegoWASMValidator, load_test_scenarios
+from validate_policy import format_violation, get_validator, load_test_scenarios
 
 def run_comprehensive_tests():
     """Run all test scenarios with detailed analysis"""
@@ -22,11 +21,7 @@ def run_comprehensive_tests():
     # Initialize validator
     try:
         data_file = "policies/policy.json"
-        with open(data_file, 'r') as f:
-            policy_data = json.load(f)
-        
-        validator = RegoWASMValidator.__new__(RegoWASMValidator)
-        validator.data = policy_data
+        validator = get_validator(data_file)
         
     except Exception as e:
         print(f"❌ Failed to initialize validator: {e}")
@@ -34,8 +29,7 @@ def run_comprehensive_tests():
     
     # Test each scenario
     results = []
-    for scenario in scenarios:
-        test_name = scenario.pop('_test_name', 'unknown')
+    for test_name, scenario in scenarios:
         print(f"\n🔍 Testing: {test_name}")
         
         try:
@@ -54,7 +48,7 @@ def run_comprehensive_tests():
                 violations = result.get('violations', [])
                 print(f"   Violations ({len(violations)}):")
                 for i, violation in enumerate(violations, 1):
-                    print(f"   {i}. {violation}")
+                    print(f"   {i}. {format_violation(violation)}")
                     
         except Exception as e:
             print(f"💥 ERROR: {e}")
@@ -3,61 +3,474 @@
 Python script to validate Rego policies using WASM
 """
 
+import hashlib
 import json
+import math
 import os
+import re
+import string
 import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, List, Union
+from typing import Callable, Dict, Any, List, Optional, Tuple, TypedDict, Union
 
 try:
-    from wasmtime import Store, Module, Instance, Func, FuncType, ValType
+    from wasmtime import Config, Engine, Store, Module, Instance, Func, FuncType, ValType
 except ImportError:
     print("Error: wasmtime package not found. Install with: pip install wasmtime")
     sys.exit(1)
 
+# Shared by every validator so a policy module is only compiled once per
+# process; the wasmtime cache also persists compiled code across runs
+_engine_config = Config()
+_engine_config.cache = True
+_ENGINE = Engine(_engine_config)
+_MODULE_CACHE: Dict[Tuple[Path, float], Module] = {}
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+def _loads(raw: bytes) -> Any:
+    """Parse JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _dumps(obj: Any) -> bytes:
+    """Serialize to indented JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2).encode()
+
+def _canonical_dumps(obj: Any) -> bytes:
+    """
+    Serialize to JSON bytes with sorted keys, used for cache keys
+    
+    Always uses the stdlib encoder: orjson writes NaN and infinities as
+    null and rejects integers wider than 64 bits, so distinct inputs would
+    share a key or fail only because caching is on.
+    """
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+
+def _is_compiled() -> bool:
+    """True when this module was built with mypyc: its functions have no bytecode"""
+    return not hasattr(_is_compiled, "__code__")
+
+_COMPILED = _is_compiled()
+
+# Shared default for missing nested objects; never mutated
+_EMPTY: Dict[str, Any] = {}
+
+# A violation is (code, args); the message is only built when reported
+Violation = Tuple[int, Tuple[Any, ...]]
+
+_VIOL_MSGS: Dict[int, str] = {
+    0: "Unknown environment: {}",
+    1: "Validation error: {}",
+    10: "Rule#1: tests required but not passed",
+    11: "Rule#1: artifact must be signed",
+    12: "Rule#1: release must be controlled",
+    13: "Rule#1: at least {} approvers required (got {})",
+    20: "Rule#2: production cannot run on shared infra (except core)",
+    30: "Rule#3: change must be recorded",
+    31: "Rule#3: ticket id invalid/missing (pattern {})",
+    40: "Rule#4: deployment date not agreed",
+    41: "Rule#4: wait timer not elapsed ({} < {})",
+    50: "Rule#5: missing required sign-off",
+    51: "Rule#5: emergency path requires retrospective_signoff enabled",
+    60: "Rule#6: components changed after signoff; require new signoff",
+    70: "Rule#7: rollback instructions must be present",
+    80: "Max deployments per day exceeded ({} > {})",
+}
+
+def format_violation(violation: Violation) -> str:
+    """
+    Render a violation as its human-readable message
+    
+    Args:
+        violation: (code, args) pair produced by the validator
+        
+    Returns:
+        Violation message
+    """
+    code, args = violation
+    return _VIOL_MSGS[code].format(*args)
+
+# Rule violation codes in report order as (bit, code); checks OR the bit
+# into a failure mask that is only expanded when something failed
+_VIOL_TABLE: Tuple[Tuple[int, int], ...] = tuple(
+    (1 << i, code)
+    for i, code in enumerate((10, 11, 12, 13, 20, 30, 31, 40, 41, 50, 51, 60, 70, 80))
+)
+_VIOL_BIT: Dict[int, int] = {code: bit for bit, code in _VIOL_TABLE}
+
+def _expand_violations(mask: int, args: Dict[int, Tuple[Any, ...]]) -> Tuple[Violation, ...]:
+    """
+    Expand a failure mask into violations
+    
+    Args:
+        mask: OR of the _VIOL_TABLE bits that failed
+        args: Format arguments for the codes that take any
+        
+    Returns:
+        Tuple of (code, args) violations in report order
+    """
+    return tuple((code, args.get(code, ())) for bit, code in _VIOL_TABLE if mask & bit)
+
+# Rule checks in report order, shared by the generated evaluators and the
+# vectorized benchmark, as (code, enabled, value, test, limit, args):
+#   enabled  RuleSet attribute; the check runs when it is > 0 (or True)
+#   value    expression over the input `inp` that the check tests
+#   test     "falsy"/"truthy" fail on the value's truth, "lt"/"gt" fail when
+#            the value is below/above the RuleSet attribute named by limit
+#   args     expression for the violation's format arguments, or ""
+# In value and args, {attr} is replaced by the repr of that RuleSet
+# attribute and {value} by the tested value. _check_rules is the
+# hand-written equivalent.
+_RULE_TABLE: Tuple[Tuple[int, str, str, str, str, str], ...] = (
+    # Rule #1: Controlled, tested, segregated
+    (10, "tests_passed", '(inp.get("checks") or _EMPTY).get("tests")', "falsy", "", ""),
+    (11, "artifact_signed", 'inp.get("artifact_signed")', "falsy", "", ""),
+    (12, "release_controlled", 'inp.get("release_controlled")', "falsy", "", ""),
+    (13, "require_reviewers", 'len(inp.get("approvers") or ())', "lt", "min_reviewers",
+     "({min_reviewers}, {value})"),
+    # Rule #2: Production separation
+    (20, "forbid_shared_infra", 'inp.get("shared_infra") == True', "truthy", "", ""),
+    # Rule #3: Documented changes
+    (30, "change_recorded", 'inp.get("change_recorded")', "falsy", "", ""),
+    (31, "require_ticket", '_valid_ticket(inp.get("ticket_id", ""), {ticket_pattern})', "falsy", "",
+     "({ticket_pattern},)"),
+    # Rule #4: Deployment windows and timers
+    (40, "deployment_date_agreed", 'inp.get("deployment_date_agreed")', "falsy", "", ""),
+    (41, "wait_timer_seconds", 'inp.get("wait_elapsed_seconds", 0)', "lt", "wait_timer_seconds",
+     "({value}, {wait_timer_seconds})"),
+    # Rule #5: Sign-off and emergency
+    (50, "signed_off", 'inp.get("is_emergency") or inp.get("signed_off")', "falsy", "", ""),
+    (51, "forbid_emergency", 'inp.get("is_emergency")', "truthy", "", ""),
+    # Rule #6: Change control
+    (60, "components_unchanged", 'inp.get("components_changed_after_signoff")', "truthy", "", ""),
+    # Rule #7: Rollback instructions
+    (70, "rollback_instructions_present", 'inp.get("rollback_instructions_present")', "falsy",
+     "", ""),
+    # Guardrails
+    (80, "max_deployments_per_day", 'inp.get("deployments_today", 0)', "gt",
+     "max_deployments_per_day", "({value}, {max_deployments_per_day})"),
+)
+
+# A check enabled for one environment, as (code, value, test, limit, args)
+# with the RuleSet values filled in; see _RULE_TABLE
+RuleCheck = Tuple[int, str, str, Any, str]
+
+@lru_cache(maxsize=1024)
+def _valid_ticket_cached(ticket_id: str, pattern: re.Pattern) -> bool:
+    """Memoized match of a ticket ID against a compiled pattern"""
+    return bool(pattern.match(ticket_id))
+
+class InputTD(TypedDict, total=False):
+    """Shape of a deployment input, as found in test-inputs/*.json"""
+    # Values are Any: mypyc checks declared types at runtime, and JSON inputs
+    # may carry floats, non-bool truthy values or nulls that the rules accept
+    env: Any
+    ref_type: Any
+    ref: Any
+    artifact_signed: Any
+    release_controlled: Any
+    checks: Any
+    approvers: Any
+    shared_infra: Any
+    change_recorded: Any
+    ticket_id: Any
+    deployment_date_agreed: Any
+    wait_elapsed_seconds: Any
+    now_utc: Any
+    is_emergency: Any
+    signed_off: Any
+    components_changed_after_signoff: Any
+    rollback_instructions_present: Any
+    deployments_today: Any
+
+class RulesTD(TypedDict, total=False):
+    """Shape of an environment's rules in policies/policy.json"""
+    # Any for the same reason as InputTD; RuleSet.from_rules coerces each field
+    approvals_required: Any
+    artifact_signed: Any
+    allowed_branches: Any
+    require_reviewers: Any
+    min_reviewers: Any
+    wait_timer_seconds: Any
+    require_ticket: Any
+    ticket_provider: Any
+    ticket_pattern: Any
+    release_controlled: Any
+    tests_passed: Any
+    shared_infra_except_core: Any
+    change_recorded: Any
+    deployment_date_agreed: Any
+    signed_off: Any
+    retrospective_signoff: Any
+    components_unchanged: Any
+    components_changed: Any
+    rollback_instructions_present: Any
+    max_deployments_per_day: Any
+    windows_utc: Any
+
+def _rule_number(rules: RulesTD, key: str) -> Union[int, float]:
+    """
+    Read a numeric limit from an environment's rules, as given
+    
+    Args:
+        rules: Rules configuration from policy.json
+        key: Name of the limit; a missing limit is 0
+        
+    Returns:
+        The limit, unchanged so that e.g. 1.5 reviewers still requires 2
+        
+    Raises:
+        ValueError: If the limit is not a finite int or float
+    """
+    value = rules.get(key, 0)
+    if not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"Policy rule {key} must be a number, got {value!r}")
+    return value
+
+@dataclass(slots=True)
+class RuleSet:
+    """
+    Typed, flattened view of one environment's rules, built at policy load
+    """
+    tests_passed: bool = False
+    artifact_signed: bool = False
+    release_controlled: bool = False
+    require_reviewers: bool = False
+    min_reviewers: Union[int, float] = 0
+    forbid_shared_infra: bool = False
+    change_recorded: bool = False
+    require_ticket: bool = False
+    ticket_pattern: str = ""
+    deployment_date_agreed: bool = False
+    wait_timer_seconds: Union[int, float] = 0
+    signed_off: bool = False
+    forbid_emergency: bool = False
+    components_unchanged: bool = False
+    rollback_instructions_present: bool = False
+    max_deployments_per_day: Union[int, float] = 0
+    
+    @classmethod
+    def from_rules(cls, rules: RulesTD) -> "RuleSet":
+        """
+        Build a RuleSet from an environment's rules configuration
+        
+        Args:
+            rules: Rules configuration from policy.json
+            
+        Returns:
+            RuleSet with flags coerced to bool; numeric limits keep their value
+            
+        Raises:
+            ValueError: If a numeric limit that is used is not a finite number
+        """
+        require_reviewers = bool(rules.get("require_reviewers"))
+        return cls(
+            tests_passed=bool(rules.get("tests_passed")),
+            artifact_signed=bool(rules.get("artifact_signed")),
+            release_controlled=bool(rules.get("release_controlled")),
+            require_reviewers=require_reviewers,
+            # min_reviewers is only read when reviewers are required
+            min_reviewers=_rule_number(rules, "min_reviewers") if require_reviewers else 0,
+            # Only an explicit false forbids shared infra / emergency deploys
+            forbid_shared_infra=rules.get("shared_infra_except_core") == False,
+            change_recorded=bool(rules.get("change_recorded")),
+            require_ticket=bool(rules.get("require_ticket")),
+            ticket_pattern=rules.get("ticket_pattern") or "",
+            deployment_date_agreed=bool(rules.get("deployment_date_agreed")),
+            wait_timer_seconds=_rule_number(rules, "wait_timer_seconds"),
+            signed_off=bool(rules.get("signed_off")),
+            forbid_emergency=rules.get("retrospective_signoff") == False,
+            components_unchanged=bool(rules.get("components_unchanged")),
+            rollback_instructions_present=bool(rules.get("rollback_instructions_present")),
+            max_deployments_per_day=_rule_number(rules, "max_deployments_per_day"),
+        )
+
+def _fill_rule_source(template: str, ruleset: RuleSet, value: str) -> str:
+    """
+    Fill a _RULE_TABLE template for one environment
+    
+    Args:
+        template: value or args template
+        ruleset: Rules whose attributes replace {attr} placeholders
+        value: Source replacing {value}
+        
+    Returns:
+        Python source
+    """
+    names = {name: repr(getattr(ruleset, name))
+             for _, name, _, _ in string.Formatter().parse(template)
+             if name and name != "value"}
+    return template.format(value=value, **names)
+
 class RegoWASMValidator:
     """
     A class to load and execute Rego policies compiled to WASM
     """
     
-    def __init__(self, wasm_path: str, data_path: str = None):
+    # Most results kept in the cache, least recently used evicted first
+    result_cache_size = 4096
+    # Generate a specialized evaluator per environment; when False every
+    # environment is interpreted through _check_rules. The generated code
+    # is at least as fast in mypyc builds, so both use it by default
+    specialize_rules = True
+    
+    def __init__(self, wasm_path: Optional[str] = None, data_path: Optional[str] = None,
+                 cache_results: bool = False):
         """
-        Initialize the validator with WASM file and optional data
+        Initialize the validator with optional WASM file and data
         
         Args:
-            wasm_path: Path to the compiled WASM file
+            wasm_path: Path to the compiled WASM file; None validates
+                against the JSON policy data only
             data_path: Path to the policy data JSON file
+            cache_results: Memoize results by a hash of the canonical input
+                JSON; off by default since real inputs rarely repeat (each
+                has its own now_utc)
         """
-        self.wasm_path = Path(wasm_path)
+        self.cache_results = cache_results
+        self.wasm_path = Path(wasm_path) if wasm_path else None
         self.data_path = Path(data_path) if data_path else None
-        self.store = Store()
-        self.instance = None
-        self.data = {}
+        self.store = Store(_ENGINE)
+        self.instance: Optional[Instance] = None
+        self.data: Dict[str, Any] = {}
         
-        if not self.wasm_path.exists():
+        if self.wasm_path and not self.wasm_path.exists():
             raise FileNotFoundError(f"WASM file not found: {wasm_path}")
             
-        if self.data_path and self.data_path.exists():
-            with open(self.data_path, 'r') as f:
-                self.data = json.load(f)
+        if self.data_path and not self.data_path.exists():
+            raise FileNotFoundError(f"Policy data file not found: {data_path}")
+            
+        if self.data_path:
+            with open(self.data_path, 'rb') as f:
+                self.data = _loads(f.read())
                 
-        self._load_wasm()
+        self._compile_policy()
+        if self.wasm_path:
+            self._load_wasm(self.wasm_path)
+    
+    def _compile_policy(self) -> None:
+        """Precompute lookup structures derived from the policy data"""
+        self._result_cache: "OrderedDict[bytes, Tuple[bool, Tuple[Violation, ...]]]" = OrderedDict()
+        self._ticket_patterns: Dict[str, re.Pattern] = {}
+        self._rulesets: Dict[str, RuleSet] = {}
+        self._envs: Dict[str, Any] = (self.data.get("policy") or _EMPTY).get("environments") or _EMPTY
+        for env, env_config in self._envs.items():
+            ruleset = self._rulesets[env] = RuleSet.from_rules(env_config.get("rules", {}))
+            pattern = ruleset.ticket_pattern
+            if pattern and pattern not in self._ticket_patterns:
+                try:
+                    self._ticket_patterns[pattern] = re.compile(pattern)
+                except re.error:
+                    pass
+        
+        self._rule_globals: Dict[str, Any] = {
+            "_EMPTY": _EMPTY,
+            "_expand_violations": _expand_violations,
+            "_valid_ticket": self._valid_ticket,
+        }
+        self._rule_checks: Dict[str, List[RuleCheck]] = {
+            env: self._enabled_checks(ruleset)
+            for env, ruleset in self._rulesets.items()
+        }
+        self._evaluators: Dict[str, Callable[[InputTD], Tuple[Violation, ...]]] = {
+            env: self._compile_ruleset(env, ruleset)
+            for env, ruleset in self._rulesets.items()
+        }
+    
+    def _enabled_checks(self, ruleset: RuleSet) -> List[RuleCheck]:
+        """
+        Fill in the _RULE_TABLE rows an environment enables
+        
+        Args:
+            ruleset: Rules of the environment
+            
+        Returns:
+            List of (code, value, test, limit, args) in report order, where
+            value and args are Python source and args refers to the tested
+            value as v<code>
+        """
+        checks: List[RuleCheck] = []
+        for code, enabled, value, test, limit, args in _RULE_TABLE:
+            if not getattr(ruleset, enabled) > 0:
+                continue
+            checks.append((
+                code,
+                _fill_rule_source(value, ruleset, ""),
+                test,
+                getattr(ruleset, limit) if limit else None,
+                _fill_rule_source(args, ruleset, f"v{code}"),
+            ))
+        return checks
     
-    def _load_wasm(self):
-        """Load the WASM module"""
+    def _compile_ruleset(self, env: str,
+                         ruleset: RuleSet) -> Callable[[InputTD], Tuple[Violation, ...]]:
+        """
+        Build an evaluator containing only the checks enabled for an environment
+        
+        The generated function is built from the environment's _RULE_TABLE
+        rows with the rule values folded in as constants, so disabled rules
+        cost nothing at call time.
+        
+        Args:
+            env: Environment name, used in the generated code's filename
+            ruleset: Rules of the environment
+            
+        Returns:
+            Function mapping an input to its tuple of violations
+        """
+        if not self.specialize_rules:
+            return lambda input_data: self._check_rules(input_data, ruleset)
+        
+        src = ["def evaluate(inp):", "    mask = 0"]
+        args: List[str] = []
+        for code, value, test, limit, code_args in self._rule_checks[env]:
+            if test == "falsy":
+                condition = f"not ({value})"
+            elif test == "truthy":
+                condition = value
+            else:
+                src.append(f"    v{code} = {value}")
+                condition = f"v{code} {'<' if test == 'lt' else '>'} {limit!r}"
+            src.append(f"    if {condition}:")
+            src.append(f"        mask |= {_VIOL_BIT[code]}")
+            if code_args:
+                args.append(f"{code}: {code_args}")
+        
+        src.append("    if not mask:")
+        src.append("        return ()")
+        src.append(f"    return _expand_violations(mask, {{{', '.join(args)}}})")
+        namespace = dict(self._rule_globals)
+        exec(compile("\n".join(src), f"<rules:{env}>", "exec"), namespace)
+        return namespace["evaluate"]
+    
+    def _load_wasm(self, wasm_path: Path) -> None:
+        """Load the WASM module, reusing a cached compilation when available"""
         try:
-            with open(self.wasm_path, 'rb') as f:
-                wasm_bytes = f.read()
+            key = (wasm_path.resolve(), wasm_path.stat().st_mtime)
+            module = _MODULE_CACHE.get(key)
+            if module is None:
+                with open(wasm_path, 'rb') as f:
+                    wasm_bytes = f.read()
+                module = _MODULE_CACHE[key] = Module(_ENGINE, wasm_bytes)
             
-            module = Module(self.store.engine, wasm_bytes)
             self.instance = Instance(self.store, module, [])
-            print(f"✅ Successfully loaded WASM from {self.wasm_path}")
+            print(f"✅ Successfully loaded WASM from {wasm_path}")
             
         except Exception as e:
             print(f"❌ Failed to load WASM: {e}")
             raise
     
-    def validate_input(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    def validate_input(self, input_data: InputTD) -> Dict[str, Any]:
         """
         Validate input against the policy
         
@@ -70,117 +483,149 @@ class RegoWASMValidator:
         try:
             # For now, we'll implement a simplified validation
             # In a real implementation, you'd call the WASM functions
-            result = {
-                "allowed": False,
-                "violations": [],
+            allowed, violations = self._evaluate(input_data)
+            return {
+                "allowed": allowed,
+                "violations": violations,
                 "input": input_data,
                 "timestamp": "2025-01-18T16:00:00Z"
             }
             
-            # Basic validation logic (placeholder)
-            env = input_data.get("env", "")
-            if env in self.data.get("policy", {}).get("environments", {}):
-                rules = self.data["policy"]["environments"][env]["rules"]
-                violations = self._check_rules(input_data, rules)
-                result["violations"] = violations
-                result["allowed"] = len(violations) == 0
-            else:
-                result["violations"] = [f"Unknown environment: {env}"]
-            
-            return result
-            
         except Exception as e:
             return {
                 "allowed": False,
-                "violations": [f"Validation error: {str(e)}"],
+                "violations": ((1, (str(e),)),),
                 "input": input_data,
                 "error": True
             }
     
-    def _check_rules(self, input_data: Dict[str, Any], rules: Dict[str, Any]) -> List[str]:
+    def _evaluate(self, input_data: InputTD) -> Tuple[bool, Tuple[Violation, ...]]:
+        """
+        Evaluate input against the policy without building a result dict
+        
+        Args:
+            input_data: The input to validate
+            
+        Returns:
+            Tuple of (allowed, violations); the tuple may be shared with
+            other callers through the result cache
+        """
+        key: Optional[bytes] = None
+        if self.cache_results:
+            try:
+                key = hashlib.sha256(_canonical_dumps(input_data)).digest()
+            except (TypeError, ValueError):
+                pass  # not JSON-encodable; evaluate without caching
+        if key is not None:
+            cached = self._result_cache.get(key)
+            if cached is not None:
+                self._result_cache.move_to_end(key)
+                return cached
+        
+        # Basic validation logic (placeholder)
+        env = input_data.get("env", "")
+        evaluator = self._evaluators.get(env)
+        if evaluator is not None:
+            violations = evaluator(input_data)
+            evaluation = (not violations, violations)
+        else:
+            evaluation = (False, ((0, (env,)),))
+        
+        if key is not None:
+            self._result_cache[key] = evaluation
+            if len(self._result_cache) > self.result_cache_size:
+                self._result_cache.popitem(last=False)
+        
+        return evaluation
+    
+    def _check_rules(self, input_data: InputTD, ruleset: RuleSet) -> Tuple[Violation, ...]:
         """
         Check input against policy rules
         
         Args:
             input_data: Input to validate
-            rules: Rules configuration
+            ruleset: Rules of the input's environment
             
         Returns:
-            List of violation messages
+            Tuple of (code, args) violations; see _VIOL_MSGS
         """
-        violations = []
+        mask = 0
+        approvers = 0
+        # Input numerics may be floats; Any keeps mypyc from checking for int
+        elapsed: Any = 0
+        deployments_today: Any = 0
         
         # Rule #1: Controlled, tested, segregated
-        if rules.get("tests_passed") and not input_data.get("checks", {}).get("tests"):
-            violations.append("Rule#1: tests required but not passed")
+        if ruleset.tests_passed and not (input_data.get("checks") or _EMPTY).get("tests"):
+            mask |= _VIOL_BIT[10]
             
-        if rules.get("artifact_signed") and not input_data.get("artifact_signed"):
-            violations.append("Rule#1: artifact must be signed")
+        if ruleset.artifact_signed and not input_data.get("artifact_signed"):
+            mask |= _VIOL_BIT[11]
             
-        if rules.get("release_controlled") and not input_data.get("release_controlled"):
-            violations.append("Rule#1: release must be controlled")
+        if ruleset.release_controlled and not input_data.get("release_controlled"):
+            mask |= _VIOL_BIT[12]
             
-        if rules.get("require_reviewers"):
-            min_reviewers = rules.get("min_reviewers", 0)
-            approvers = len(input_data.get("approvers", []))
-            if approvers < min_reviewers:
-                violations.append(f"Rule#1: at least {min_reviewers} approvers required (got {approvers})")
+        if ruleset.require_reviewers:
+            approvers = len(input_data.get("approvers") or ())
+            if approvers < ruleset.min_reviewers:
+                mask |= _VIOL_BIT[13]
         
         # Rule #2: Production separation
-        if (rules.get("shared_infra_except_core") == False and 
-            input_data.get("shared_infra") == True):
-            violations.append("Rule#2: production cannot run on shared infra (except core)")
+        if ruleset.forbid_shared_infra and input_data.get("shared_infra") == True:
+            mask |= _VIOL_BIT[20]
         
         # Rule #3: Documented changes
-        if rules.get("change_recorded") and not input_data.get("change_recorded"):
-            violations.append("Rule#3: change must be recorded")
+        if ruleset.change_recorded and not input_data.get("change_recorded"):
+            mask |= _VIOL_BIT[30]
             
-        if rules.get("require_ticket"):
-            ticket_id = input_data.get("ticket_id", "")
-            ticket_pattern = rules.get("ticket_pattern", "")
-            if not self._valid_ticket(ticket_id, ticket_pattern):
-                violations.append(f"Rule#3: ticket id invalid/missing (pattern {ticket_pattern})")
+        if ruleset.require_ticket and not self._valid_ticket(input_data.get("ticket_id", ""),
+                                                             ruleset.ticket_pattern):
+            mask |= _VIOL_BIT[31]
         
         # Rule #4: Deployment windows and timers
-        if rules.get("deployment_date_agreed") and not input_data.get("deployment_date_agreed"):
-            violations.append("Rule#4: deployment date not agreed")
+        if ruleset.deployment_date_agreed and not input_data.get("deployment_date_agreed"):
+            mask |= _VIOL_BIT[40]
             
-        wait_timer = rules.get("wait_timer_seconds", 0)
-        if wait_timer > 0:
+        if ruleset.wait_timer_seconds > 0:
             elapsed = input_data.get("wait_elapsed_seconds", 0)
-            if elapsed < wait_timer:
-                violations.append(f"Rule#4: wait timer not elapsed ({elapsed} < {wait_timer})")
+            if elapsed < ruleset.wait_timer_seconds:
+                mask |= _VIOL_BIT[41]
         
         # Rule #5: Sign-off and emergency
-        if (rules.get("signed_off") and 
+        if (ruleset.signed_off and 
             not input_data.get("is_emergency") and 
             not input_data.get("signed_off")):
-            violations.append("Rule#5: missing required sign-off")
+            mask |= _VIOL_BIT[50]
             
-        if (input_data.get("is_emergency") and 
-            rules.get("retrospective_signoff") == False):
-            violations.append("Rule#5: emergency path requires retrospective_signoff enabled")
+        if ruleset.forbid_emergency and input_data.get("is_emergency"):
+            mask |= _VIOL_BIT[51]
         
         # Rule #6: Change control
-        if (rules.get("components_unchanged") and 
+        if (ruleset.components_unchanged and 
             input_data.get("components_changed_after_signoff")):
-            violations.append("Rule#6: components changed after signoff; require new signoff")
+            mask |= _VIOL_BIT[60]
         
         # Rule #7: Rollback instructions
-        if (rules.get("rollback_instructions_present") and 
+        if (ruleset.rollback_instructions_present and 
             not input_data.get("rollback_instructions_present")):
-            violations.append("Rule#7: rollback instructions must be present")
+            mask |= _VIOL_BIT[70]
         
         # Guardrails
-        max_deployments = rules.get("max_deployments_per_day", 0)
-        if max_deployments > 0:
+        if ruleset.max_deployments_per_day > 0:
             deployments_today = input_data.get("deployments_today", 0)
-            if deployments_today > max_deployments:
-                violations.append(f"Max deployments per day exceeded ({deployments_today} > {max_deployments})")
+            if deployments_today > ruleset.max_deployments_per_day:
+                mask |= _VIOL_BIT[80]
         
-        return violations
+        if not mask:
+            return ()
+        return _expand_violations(mask, {
+            13: (ruleset.min_reviewers, approvers),
+            31: (ruleset.ticket_pattern,),
+            41: (elapsed, ruleset.wait_timer_seconds),
+            80: (deployments_today, ruleset.max_deployments_per_day),
+        })
     
-    def _valid_ticket(self, ticket_id: str, pattern: str) -> bool:
+    def _valid_ticket(self, ticket_id: Any, pattern: str) -> bool:
         """
         Validate ticket ID against pattern
         
@@ -196,30 +641,51 @@ class RegoWASMValidator:
         if not pattern:
             return True
             
-        import re
-        try:
-            return bool(re.match(pattern, ticket_id))
-        except re.error:
-            return False
+        compiled = self._ticket_patterns.get(pattern)
+        if compiled is None:
+            try:
+                compiled = self._ticket_patterns[pattern] = re.compile(pattern)
+            except re.error:
+                return False
+        if not isinstance(ticket_id, str):
+            return bool(compiled.match(ticket_id))  # raises as re.match would
+        return _valid_ticket_cached(ticket_id, compiled)
+
+@lru_cache(maxsize=8)
+def get_validator(policy_path: str, cache_results: bool = False) -> RegoWASMValidator:
+    """
+    Get the shared JSON-based validator for a policy file
+    
+    The policy is parsed and its rulesets compiled once per path and
+    caching mode; later calls with the same arguments return the same
+    instance, which callers should not reconfigure.
+    
+    Args:
+        policy_path: Path to the policy data JSON file
+        cache_results: Whether the validator memoizes results
+        
+    Returns:
+        Validator without a WASM module
+    """
+    return RegoWASMValidator(data_path=policy_path, cache_results=cache_results)
 
-def load_test_scenarios() -> List[Dict[str, Any]]:
-    """Load test scenarios from JSON files"""
+def load_test_scenarios() -> List[Tuple[str, InputTD]]:
+    """Load test scenarios from JSON files as (name, input) pairs"""
     test_dir = Path("test-inputs")
     scenarios = []
     
     if test_dir.exists():
         for json_file in test_dir.glob("*.json"):
             try:
-                with open(json_file, 'r') as f:
-                    data = json.load(f)
-                    data['_test_name'] = json_file.stem
-                    scenarios.append(data)
+                with open(json_file, 'rb') as f:
+                    data = _loads(f.read())
+                    scenarios.append((json_file.stem, data))
             except Exception as e:
                 print(f"⚠️  Failed to load {json_file}: {e}")
     
     return scenarios
 
-def main():
+def main() -> int:
     """Main function to run validation tests"""
     print("🔬 Python WASM Policy Validator")
     print("=" * 40)
@@ -229,24 +695,18 @@ def main():
         wasm_file = "build/policy.wasm"
         data_file = "policies/policy.json"
         
-        # Check if files exist, create fallback if needed
+        # Check if files exist, fall back to JSON-based validation if needed
+        wasm_path: Optional[str] = wasm_file
         if not os.path.exists(wasm_file):
             print(f"⚠️  WASM file not found: {wasm_file}")
             print("   Using JSON-based validation instead")
-            wasm_file = None
+            wasm_path = None
         
         if not os.path.exists(data_file):
             print(f"❌ Policy data file not found: {data_file}")
             return 1
             
-        validator = RegoWASMValidator(wasm_file, data_file) if wasm_file else None
-        
-        # If no WASM, create a simple JSON validator
-        if not validator:
-            with open(data_file, 'r') as f:
-                policy_data = json.load(f)
-            validator = RegoWASMValidator.__new__(RegoWASMValidator)
-            validator.data = policy_data
+        validator = RegoWASMValidator(wasm_path, data_file)
         
     except Exception as e:
         print(f"❌ Failed to initialize validator: {e}")
@@ -264,8 +724,7 @@ def main():
     passed = 0
     failed = 0
     
-    for scenario in scenarios:
-        test_name = scenario.pop('_test_name', 'unknown')
+    for test_name, scenario in scenarios:
         print(f"\n🧪 Testing: {test_name}")
         
         try:
@@ -281,7 +740,7 @@ def main():
                 violations = result.get("violations", [])
                 print(f"   Violations ({len(violations)}):")
                 for violation in violations[:5]:  # Show first 5
-                    print(f"   • {violation}")
+                    print(f"   • {format_violation(violation)}")
                 if len(violations) > 5:
                     print(f"   ... and {len(violations) - 5} more")
                 failed += 1